@@ -1,197 +1,380 @@
-from enum import Enum
+import math
+from enum import IntEnum
+from types import MappingProxyType
 from dataclasses import dataclass
-from typing import Dict, List, Tuple, Optional
+from functools import lru_cache
+from typing import Dict, Mapping, Tuple, Optional
 import numpy as np
+from scipy.special import ndtr, ndtri
 
-class MolecularFeatures(Enum):
+try:
+    from numba import njit
+except ImportError:  # Numba is optional; the kernel then runs as plain Python
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+class MolecularFeatures(IntEnum):
     """Comprehensive molecular features for HIV-immune system interaction"""
     
     # T-Cell Features (128 total)
-    CD4_DENSITY = "cd4_receptor_density"
+    CD4_DENSITY = 0
     """Surface density of CD4 receptors (receptors/μm²).
     Critical for initial HIV binding. Normal range: 100-1000/μm².
     Higher density increases infection probability."""
     
-    MEMBRANE_FLUIDITY = "membrane_fluidity"
+    MEMBRANE_FLUIDITY = 1
     """Lipid bilayer fluidity (0-1 scale).
     Affects fusion efficiency and receptor mobility.
     Temperature and cholesterol dependent."""
     
-    CORECEPTOR_STATUS = "coreceptor_status"
+    CORECEPTOR_STATUS = 2
     """CCR5/CXCR4 availability (ratio).
     Determines viral tropism and entry efficiency.
     Key factor in R5/X4 strain susceptibility."""
     
-    VESICLE_COUNT = "vesicle_count"
+    VESICLE_COUNT = 3
     """Number of transport vesicles.
     Influences viral particle trafficking.
     Normal range: 10-100 per cell."""
     
-    ATP_LEVEL = "atp_concentration"
+    ATP_LEVEL = 4
     """Cellular energy state (mM).
     Powers viral processes and immune responses.
     Critical threshold: 1-10 mM."""
     
-    T_CELL_ACTIVATION = "t_cell_activation_level"
+    T_CELL_ACTIVATION = 5
     """T-cell activation state (0-1 scale).
     Higher activation increases viral replication.
     Influences cytokine production."""
     
     # HIV Features (128 total)
-    ENV_PROTEIN_STATE = "env_protein_conformation"
+    ENV_PROTEIN_STATE = 6
     """gp120/gp41 conformational state.
     Determines binding efficiency and immune evasion.
     Multiple conformational states possible."""
     
-    RNA_INTEGRITY = "viral_rna_integrity"
+    RNA_INTEGRITY = 7
     """Genetic material state (0-1 scale).
     Affects replication fidelity and drug resistance.
     Mutation rate: ~3x10^-5 per base per cycle."""
     
-    REVERSE_TRANSCRIPTASE = "rt_activity"
+    REVERSE_TRANSCRIPTASE = 8
     """RT enzyme activity level (0-1 scale).
     Critical for viral genome replication.
     Target of NRTI/NNRTI drugs."""
     
-    CAPSID_STABILITY = "capsid_stability"
+    CAPSID_STABILITY = 9
     """Viral core integrity (0-1 scale).
     Influences uncoating timing and efficiency.
     Temperature and pH dependent."""
     
-    VIRAL_LOAD = "viral_load"
+    VIRAL_LOAD = 10
     """Viral particles per mL.
     Key clinical marker of infection progress.
     Normal range: 40-10^6 copies/mL."""
     
-    REPLICATION_RATE = "replication_rate"
+    REPLICATION_RATE = 11
     """New virions produced per day.
     Affected by cell activation and resources.
     Typical range: 10^8-10^9 per day."""
     
-    DRUG_RESISTANCE = "drug_resistance_mutations"
+    DRUG_RESISTANCE = 12
     """Presence of resistance mutations (0-1 scale).
     Affects treatment efficacy.
     Multiple resistance pathways possible."""
     
     # Immune Features (128 total)
-    ANTIBODY_SPECIFICITY = "antibody_binding_sites"
+    ANTIBODY_SPECIFICITY = 13
     """Antibody binding characteristics.
     Determines neutralization efficiency.
     Evolves during infection."""
     
-    MEMORY_CELL_STATUS = "immune_memory_state"
+    MEMORY_CELL_STATUS = 14
     """Learned immune responses (0-1 scale).
     Affects recognition speed and specificity.
     Builds over infection course."""
     
-    CYTOKINE_LEVELS = "cytokine_concentration"
+    CYTOKINE_LEVELS = 15
     """Immune signaling molecules (pg/mL).
     Coordinates immune response.
     Multiple cytokine types tracked."""
     
-    INTERFERON_RESPONSE = "interferon_levels"
+    INTERFERON_RESPONSE = 16
     """Type I/II interferon activity.
     Crucial for antiviral state induction.
     Measured in International Units/mL."""
     
-    NK_CELL_ACTIVITY = "natural_killer_activity"
+    NK_CELL_ACTIVITY = 17
     """NK cell cytotoxic activity (0-1 scale).
     Early response to viral infection.
     Cytokine-dependent activation."""
 
+# Identifier of each feature, aligned with its MolecularFeatures index
+FEATURE_NAMES: Tuple[str, ...] = (
+    "cd4_receptor_density",
+    "membrane_fluidity",
+    "coreceptor_status",
+    "vesicle_count",
+    "atp_concentration",
+    "t_cell_activation_level",
+    "env_protein_conformation",
+    "viral_rna_integrity",
+    "rt_activity",
+    "capsid_stability",
+    "viral_load",
+    "replication_rate",
+    "drug_resistance_mutations",
+    "antibody_binding_sites",
+    "immune_memory_state",
+    "cytokine_concentration",
+    "interferon_levels",
+    "natural_killer_activity",
+)
+N_FEATURES = len(FEATURE_NAMES)
+
+# Default generator for random state initialization; callers needing
+# reproducible states pass their own seeded Generator as `rng`
+_RNG = np.random.default_rng()
+
+def _constraint_array(constraints, key: str, fill: float, position: Optional[int] = None) -> np.ndarray:
+    """
+    Gather one constraint field into a read-only array indexed by MolecularFeatures,
+    using `fill` for features that do not define it
+    """
+    array = np.full(N_FEATURES, fill, dtype=np.float64)
+    for feature, spec in constraints.items():
+        if key in spec:
+            value = spec[key]
+            array[feature] = value if position is None else value[position]
+    array.setflags(write=False)
+    return array
+
+def _derive_schema(constraints) -> Tuple[np.ndarray, ...]:
+    """
+    Per-feature arrays for a CONSTRAINTS schema
+    Returns: (lows, highs, criticals, constrained, unconstrained,
+              means, stds, phi_a, phi_span)
+    """
+    lows = _constraint_array(constraints, "range", -np.inf, position=0)
+    highs = _constraint_array(constraints, "range", np.inf, position=1)
+    criticals = _constraint_array(constraints, "critical_threshold", -np.inf)
+    
+    constrained = np.flatnonzero(np.isfinite(lows))
+    unconstrained = np.flatnonzero(~np.isfinite(lows))
+    means = (lows[constrained] + highs[constrained]) / 2
+    stds = (highs[constrained] - lows[constrained]) / 6  # 99.7% within range
+    # Standard normal CDF at the truncation points: Φ(a), Φ(b) - Φ(a)
+    phi_a = ndtr((lows[constrained] - means) / stds)
+    phi_span = ndtr((highs[constrained] - means) / stds) - phi_a
+    return lows, highs, criticals, constrained, unconstrained, means, stds, phi_a, phi_span
+
+@njit(cache=True)
+def _init_and_validate(lows, highs, criticals, means, stds, constrained, z, rand_u, out_values):
+    """
+    Fill `out_values` from uniform draws (unconstrained features) and
+    standard-normal quantiles `z` (constrained features), returning a
+    bitmask with bit i set when feature i violates its constraints
+    """
+    out_values[:] = rand_u
+    for k in range(constrained.shape[0]):
+        out_values[constrained[k]] = means[k] + stds[k] * z[k]
+    
+    mask = 0
+    for i in range(out_values.shape[0]):
+        x = out_values[i]
+        if x < lows[i] or x > highs[i] or x < criticals[i]:
+            mask |= 1 << i
+    return mask
+
 @dataclass
 class MolecularState:
     """
     Comprehensive molecular state representation with biological constraints
     and initialization parameters
     """
-    def __init__(self, random_init: bool = False):
-        self.features: Dict[MolecularFeatures, float] = {}
-        self.constraints = {
-            MolecularFeatures.CD4_DENSITY: {
-                "range": (100, 1000),  # receptors/μm²
-                "description": "Normal T-cell surface density range",
-                "critical_threshold": 200  # Min for viable infection
-            },
-            MolecularFeatures.MEMBRANE_FLUIDITY: {
-                "range": (0.1, 1.0),
-                "description": "Normalized fluidity scale",
-                "optimal_range": (0.4, 0.6)  # Best for fusion
-            },
-            MolecularFeatures.ATP_LEVEL: {
-                "range": (1, 10),  # mM
-                "description": "Cellular ATP concentration",
-                "critical_threshold": 2  # Min for viral processes
-            },
-            MolecularFeatures.VIRAL_LOAD: {
-                "range": (40, 1e6),  # copies/mL
-                "description": "Clinical viral load range",
-                "detection_threshold": 40
-            },
-            MolecularFeatures.INTERFERON_RESPONSE: {
-                "range": (0, 1000),  # IU/mL
-                "description": "Interferon activity level",
-                "effective_threshold": 100
-            }
-        }
-        
+    __slots__ = ("values",)
+    
+    CONSTRAINTS = MappingProxyType({
+        MolecularFeatures.CD4_DENSITY: MappingProxyType({
+            "range": (100, 1000),  # receptors/μm²
+            "description": "Normal T-cell surface density range",
+            "critical_threshold": 200  # Min for viable infection
+        }),
+        MolecularFeatures.MEMBRANE_FLUIDITY: MappingProxyType({
+            "range": (0.1, 1.0),
+            "description": "Normalized fluidity scale",
+            "optimal_range": (0.4, 0.6)  # Best for fusion
+        }),
+        MolecularFeatures.ATP_LEVEL: MappingProxyType({
+            "range": (1, 10),  # mM
+            "description": "Cellular ATP concentration",
+            "critical_threshold": 2  # Min for viral processes
+        }),
+        MolecularFeatures.VIRAL_LOAD: MappingProxyType({
+            "range": (40, 1e6),  # copies/mL
+            "description": "Clinical viral load range",
+            "detection_threshold": 40
+        }),
+        MolecularFeatures.INTERFERON_RESPONSE: MappingProxyType({
+            "range": (0, 1000),  # IU/mL
+            "description": "Interferon activity level",
+            "effective_threshold": 100
+        })
+    })
+    
+    # Per-feature bounds indexed by MolecularFeatures (unconstrained → ±inf)
+    # and truncated-normal sampling parameters, all derived from CONSTRAINTS
+    (LOWS, HIGHS, CRITICAL,
+     _CONSTRAINED, _UNCONSTRAINED, _MEANS, _STDS, _PHI_A, _PHI_SPAN) = _derive_schema(CONSTRAINTS)
+    
+    def __init_subclass__(cls, **kwargs):
+        # A subclass overriding CONSTRAINTS gets its own arrays and validator
+        super().__init_subclass__(**kwargs)
+        if "CONSTRAINTS" in vars(cls):
+            (cls.LOWS, cls.HIGHS, cls.CRITICAL,
+             cls._CONSTRAINED, cls._UNCONSTRAINED, cls._MEANS, cls._STDS,
+             cls._PHI_A, cls._PHI_SPAN) = _derive_schema(cls.CONSTRAINTS)
+            cls.validate_state = _compile_validator(cls)
+    
+    def __init__(self, random_init: bool = False, rng: np.random.Generator = _RNG):
         if random_init:
-            self.initialize_random_state()
+            # Every slot is overwritten, so skip the NaN fill
+            self.values = np.empty(N_FEATURES, dtype=np.float64)
+            self.initialize_random_state(rng)
+        else:
+            # NaN marks an unset feature: validation skips it, as it did
+            # for features missing from the old dict
+            self.values = np.full(N_FEATURES, np.nan, dtype=np.float64)
     
-    def initialize_random_state(self) -> None:
+    @classmethod
+    def batch_random(cls, n: int, dtype=np.float32, rng: np.random.Generator = _RNG) -> np.ndarray:
         """
-        Initialize state with random but biologically plausible values
+        Draw `n` random states at once, with the same distribution as
+        initialize_random_state, without constructing MolecularState objects
+        Returns: array of shape (n, N_FEATURES)
         """
-        for feature in MolecularFeatures:
-            if feature in self.constraints:
-                min_val, max_val = self.constraints[feature]["range"]
-                # Use truncated normal distribution for more realistic values
-                mean = (min_val + max_val) / 2
-                std = (max_val - min_val) / 6  # 99.7% within range
-                value = np.random.normal(mean, std)
-                value = np.clip(value, min_val, max_val)
-                self.features[feature] = value
-            else:
-                # Default to normalized range for unconstrained features
-                self.features[feature] = np.random.random()
-    
-    def validate_state(self) -> Tuple[bool, List[str]]:
+        u = rng.random((n, N_FEATURES))
+        batch = np.empty((n, N_FEATURES), dtype=dtype)
+        batch[:, cls._CONSTRAINED] = cls._MEANS + cls._STDS * ndtri(
+            cls._PHI_A + u[:, cls._CONSTRAINED] * cls._PHI_SPAN
+        )
+        batch[:, cls._UNCONSTRAINED] = u[:, cls._UNCONSTRAINED]
+        return batch
+    
+    @property
+    def features(self) -> Mapping[MolecularFeatures, float]:
         """
-        Ensures biological constraints are met
-        Returns: (is_valid, list of violations)
+        Read-only feature → value snapshot of the set (non-NaN) features,
+        built on demand from `values`.
+        Writes raise TypeError: set features through `values` instead.
+        """
+        return MappingProxyType({
+            feature: value
+            for feature, value in zip(MolecularFeatures, self.values.tolist())
+            if not math.isnan(value)
+        })
+    
+    def initialize_random_state(self, rng: np.random.Generator = _RNG) -> int:
         """
-        violations = []
-        for feature, value in self.features.items():
-            if feature in self.constraints:
-                min_val, max_val = self.constraints[feature]["range"]
-                if value < min_val or value > max_val:
-                    violations.append(
-                        f"{feature.value}: {value} outside range [{min_val}, {max_val}]"
-                    )
-                    
-                if "critical_threshold" in self.constraints[feature]:
-                    threshold = self.constraints[feature]["critical_threshold"]
-                    if value < threshold:
-                        violations.append(
-                            f"{feature.value}: {value} below critical threshold {threshold}"
-                        )
+        Initialize state with random but biologically plausible values,
+        drawn from `rng` (pass a seeded Generator for reproducible states)
+        Returns: bitmask with bit i set when feature i violates its constraints
+        """
+        u = rng.random(N_FEATURES)
+        
+        # Use truncated normal distribution for more realistic values,
+        # sampled by inverse CDF: x = μ + σ·Φ⁻¹(Φ(a) + u·(Φ(b) - Φ(a)))
+        z = ndtri(self._PHI_A + u[self._CONSTRAINED] * self._PHI_SPAN)
         
-        return len(violations) == 0, violations
+        return _init_and_validate(
+            self.LOWS, self.HIGHS, self.CRITICAL, self._MEANS, self._STDS,
+            self._CONSTRAINED, z, u, self.values
+        )
     
     def get_feature_description(self, feature: MolecularFeatures) -> str:
         """
         Get biological description and constraints for a feature
         """
-        description = feature.value
-        if feature in self.constraints:
-            constraints = self.constraints[feature]
-            description += f"\nRange: {constraints['range']}"
-            description += f"\nDescription: {constraints['description']}"
-            if "critical_threshold" in constraints:
-                description += f"\nCritical threshold: {constraints['critical_threshold']}"
-            if "optimal_range" in constraints:
-                description += f"\nOptimal range: {constraints['optimal_range']}"
-        return description
+        return _feature_description(type(self), feature)
+
+def as_state_tensor(batch: np.ndarray, device="cpu"):
+    """
+    Wrap a batch from MolecularState.batch_random as a torch tensor on
+    `device`, sharing memory with the array when it stays on the CPU
+    """
+    import torch  # Only needed by callers feeding the neural network
+    
+    return torch.from_numpy(batch).to(device, non_blocking=True)
+
+def _compile_validator(state_cls: type):
+    """
+    Generate validate_state for the fixed constraint schema of `state_cls`.
+    Only feature indices are written into the generated source; bounds and
+    message text are bound as globals of the generated function, so any
+    float (including ±inf) and any schema text is safe.
+    """
+    checks, namespace = [], {}
+    for feature in MolecularFeatures:
+        spec = state_cls.CONSTRAINTS.get(feature)
+        if spec is None:
+            continue
+        idx = int(feature)
+        namespace[f"_name{idx}"] = FEATURE_NAMES[feature]
+        # Messages show the schema values as written, comparisons use floats
+        if "range" in spec:
+            low, high = spec["range"]
+            namespace[f"_lo{idx}"], namespace[f"_hi{idx}"] = float(low), float(high)
+            namespace[f"_range{idx}"] = f" outside range [{low}, {high}]"
+            checks.append(
+                f"    if v[{idx}] < _lo{idx} or v[{idx}] > _hi{idx}:\n"
+                f"        violations.append(f'{{_name{idx}}}: {{v[{idx}]}}{{_range{idx}}}')\n"
+            )
+        if "critical_threshold" in spec:
+            critical = spec["critical_threshold"]
+            namespace[f"_crit{idx}"] = float(critical)
+            namespace[f"_below{idx}"] = f" below critical threshold {critical}"
+            checks.append(
+                f"    if v[{idx}] < _crit{idx}:\n"
+                f"        violations.append(f'{{_name{idx}}}: {{v[{idx}]}}{{_below{idx}}}')\n"
+            )
+    
+    source = (
+        "def validate_state(self):\n"
+        "    v = self.values.tolist()\n"
+        "    violations = []\n"
+        + "".join(checks)
+        + "    return not violations, violations\n"
+    )
+    exec(compile(source, f"<{state_cls.__name__}.validate_state>", "exec"), namespace)  # pylint: disable=exec-used
+    
+    validate_state = namespace["validate_state"]
+    validate_state.__doc__ = """
+        Ensures biological constraints are met
+        Returns: (is_valid, list of violations)
+        """
+    validate_state.__qualname__ = f"{state_cls.__qualname__}.validate_state"
+    return validate_state
+
+MolecularState.validate_state = _compile_validator(MolecularState)
+
+@lru_cache(maxsize=None)
+def _feature_description(state_cls: type, feature: MolecularFeatures) -> str:
+    """
+    Build the description text once per (state class, feature) pair;
+    it depends only on the class-level CONSTRAINTS schema
+    """
+    description = FEATURE_NAMES[feature]
+    if feature in state_cls.CONSTRAINTS:
+        constraints = state_cls.CONSTRAINTS[feature]
+        description += f"\nRange: {constraints['range']}"
+        description += f"\nDescription: {constraints['description']}"
+        if "critical_threshold" in constraints:
+            description += f"\nCritical threshold: {constraints['critical_threshold']}"
+        if "optimal_range" in constraints:
+            description += f"\nOptimal range: {constraints['optimal_range']}"
+    return description
 
 if __name__ == "__main__":
     # Example usage and validation
@@ -199,7 +382,7 @@ if __name__ == "__main__":
     is_valid, violations = state.validate_state()
     
     print("Initial Molecular State:")
-    for feature, value in state.features.items():
+    for feature, value in zip(MolecularFeatures, state.values):
         print(f"\n{feature.name}:")
         print(state.get_feature_description(feature))
         print(f"Current value: {value}")
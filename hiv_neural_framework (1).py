@@ -1,9 +1,16 @@
 import torch
 import torch.nn as nn
+import torch.nn.functional as F
 import numpy as np
-from dataclasses import dataclass
+from typing import Tuple
+
+# Component equations of the state space S = {T, H, I}
+STATE_EQUATIONS = {
+    'T_cell': 'T(t) = [P(t), M(t), V(t)]',  # Proteins, Membrane, Vesicles
+    'HIV': 'H(t) = [S(t), R(t), B(t)]',     # Surface, RNA, Binding
+    'Immune': 'I(t) = [A(t), R(t), K(t)]'    # Antibodies, Recognition, Kill
+}
 
-@dataclass
 class StateSpace:
     """
     Mathematical representation of complete state space
@@ -17,13 +24,6 @@ class StateSpace:
     IMMUNE_DIM = 128  # 64 + 32 + 32
     TOTAL_DIM = T_CELL_DIM + HIV_DIM + IMMUNE_DIM
 
-    def __post_init__(self):
-        self.state_equations = {
-            'T_cell': 'T(t) = [P(t), M(t), V(t)]',  # Proteins, Membrane, Vesicles
-            'HIV': 'H(t) = [S(t), R(t), B(t)]',     # Surface, RNA, Binding
-            'Immune': 'I(t) = [A(t), R(t), K(t)]'    # Antibodies, Recognition, Kill
-        }
-
 class ActionSpace:
     """
     A = {Am ∪ Ab ∪ Ar} where:
@@ -58,48 +58,46 @@ class HIVNeuralNetwork(nn.Module):
         # h1 = σ(W1s + b1)
         self.input_layer = nn.Sequential(
             nn.Linear(state_dim, 512),
-            nn.BatchNorm1d(512),
+            nn.LayerNorm(512),
             nn.ReLU()
         )
         
         # ResBlock: hi → hi+1
         # hi+1 = hi + F(hi; θi)
-        self.res_blocks = nn.ModuleList([
+        self.trunk = nn.Sequential(*[
             ResBlock(512) for _ in range(10)
         ])
         
-        # Policy head: h → π
-        # π(a|s) = softmax(Wπh + bπ)
-        self.policy_head = nn.Sequential(
+        # Shared head: h → g
+        # g = σ(Wg h + bg)
+        self.shared_head = nn.Sequential(
             nn.Linear(512, 128),
-            nn.ReLU(),
-            nn.Linear(128, action_dim),
-            nn.Softmax(dim=1)
+            nn.ReLU()
         )
         
-        # Value head: h → v
-        # v(s) = tanh(Wvh + bv)
-        self.value_head = nn.Sequential(
-            nn.Linear(512, 128),
-            nn.ReLU(),
-            nn.Linear(128, 1),
-            nn.Tanh()
-        )
+        # Fused policy/value output: g → [z, v]
+        # z = Wπg + bπ (logits, π(a|s) = softmax(z)),  v(s) = tanh(Wvg + bv)
+        self.out = nn.Linear(128, action_dim + 1)
 
-    def forward(self, state):
+    def forward(self, state: torch.Tensor, return_probs: bool = False) -> Tuple[torch.Tensor, torch.Tensor]:
         """
         Forward pass:
-        f(s) = [π(a|s), v(s)]
-        """
-        h = self.input_layer(state)
+        f(s) = [z(s), v(s)]
         
-        for res_block in self.res_blocks:
-            h = res_block(h)
+        Returns raw policy logits z by default, which is all that greedy
+        argmax selection or sampling via Categorical(logits=z) needs;
+        pass return_probs=True to get π(a|s) = softmax(z) instead.
+        Activations are functional calls so the whole pass is scriptable.
+        """
+        h = self.trunk(self.input_layer(state))
         
-        policy = self.policy_head(h)
-        value = self.value_head(h)
+        o = self.out(self.shared_head(h))
+        logits = o[:, :-1]
+        value = torch.tanh(o[:, -1:])
         
-        return policy, value
+        if return_probs:
+            return torch.softmax(logits, dim=1), value
+        return logits, value
 
 class ResBlock(nn.Module):
     """
@@ -111,15 +109,35 @@ class ResBlock(nn.Module):
         super().__init__()
         self.layers = nn.Sequential(
             nn.Linear(channels, channels),
-            nn.BatchNorm1d(channels),
+            nn.LayerNorm(channels),
             nn.ReLU(),
             nn.Linear(channels, channels),
-            nn.BatchNorm1d(channels)
+            nn.LayerNorm(channels)
         )
         
     def forward(self, x):
         return x + self.layers(x)
 
+def build_network(state_dim=StateSpace.TOTAL_DIM, action_dim=ActionSpace.HIV_ACTIONS,
+                  compile_network=True):
+    """
+    Construct HIVNeuralNetwork for fixed-shape inference/training.
+    With PyTorch ≥ 2.0 the model is wrapped in torch.compile so the
+    Linear/LayerNorm/ReLU trunk is fused and replayed as a captured graph;
+    older versions get a TorchScript module instead of eager mode.
+    """
+    network = HIVNeuralNetwork(state_dim, action_dim)
+    if not compile_network:
+        return network
+    if hasattr(torch, "compile"):
+        return torch.compile(
+            network,
+            mode="reduce-overhead",
+            fullgraph=True,
+            dynamic=False
+        )
+    return torch.jit.script(network)
+
 class RewardFunction:
     """
     R(s,a) = w1*P(survival) + w2*P(immune_evasion) - w3*P(detection) - w4*E(resource_cost)
@@ -129,7 +147,8 @@ class RewardFunction:
     E(resource_cost) ≥ 0
     """
     def __init__(self, w1=1.0, w2=1.0, w3=0.8, w4=0.5):
-        self.weights = [w1, w2, w3, w4]
+        # Signed weights so R(s,a) = w · [P(survival), P(evasion), P(detection), E(cost)]
+        self.w = np.array([w1, w2, -w3, -w4], dtype=np.float64)
         
     def compute_reward(self, survival_p, evasion_p, detection_p, resource_cost):
         """
@@ -138,10 +157,19 @@ class RewardFunction:
         assert all(0 <= p <= 1 for p in [survival_p, evasion_p, detection_p])
         assert resource_cost >= 0
         
-        return (self.weights[0] * survival_p + 
-                self.weights[1] * evasion_p - 
-                self.weights[2] * detection_p - 
-                self.weights[3] * resource_cost)
+        return float(self.w @ (survival_p, evasion_p, detection_p, resource_cost))
+    
+    def compute_rewards(self, terms):
+        """
+        Batched rewards for an array of shape (B, 4) whose columns are
+        [P(survival), P(evasion), P(detection), E(resource_cost)]
+        Returns: array of shape (B,)
+        """
+        terms = np.asarray(terms, dtype=np.float64)
+        assert np.all((terms[:, :3] >= 0) & (terms[:, :3] <= 1))
+        assert np.all(terms[:, 3] >= 0)
+        
+        return terms @ self.w
 
 class Training:
     """
@@ -150,17 +178,45 @@ class Training:
     L_π = -log(π(a|s)) * A(s,a)    [Policy Loss]
     L_v = (V(s) - R)²              [Value Loss]
     L_reg = ||θ||²                 [Regularization]
+    
+    Mixed precision: run forward and loss under `autocast()`, then step via
+    the scaler, which is a pass-through unless FP16 is in use:
+        scaler = training.grad_scaler
+        scaler.scale(loss).backward()
+        scaler.unscale_(optimizer)  # before clipping to gradient_clip
+        scaler.step(optimizer)
+        scaler.update()
     """
     def __init__(self):
         self.batch_size = 512
         self.learning_rate = 2e-4
         self.gradient_clip = 1.0
         
-    def policy_loss(self, policy, actions, advantages):
+        # Mixed precision: BF16 keeps FP32's exponent range so no loss
+        # scaling is needed; CUDA devices without BF16 fall back to FP16,
+        # whose losses must go through grad_scaler
+        use_fp16 = torch.cuda.is_available() and not torch.cuda.is_bf16_supported()
+        self.amp_dtype = torch.float16 if use_fp16 else torch.bfloat16
+        if hasattr(torch, "amp") and hasattr(torch.amp, "GradScaler"):
+            self.grad_scaler = torch.amp.GradScaler("cuda", enabled=use_fp16)
+        else:  # torch < 2.3
+            self.grad_scaler = torch.cuda.amp.GradScaler(enabled=use_fp16)
+        
+    def autocast(self, device_type="cuda"):
+        """
+        Autocast context for forward pass and loss computation;
+        normalization layers stay in FP32 under autocast's default rules
+        """
+        return torch.autocast(device_type=device_type, dtype=self.amp_dtype)
+        
+    def policy_loss(self, logits, actions, advantages):
         """
-        Policy gradient loss
+        Policy gradient loss, computed from raw logits with a fused
+        log_softmax instead of log(softmax(z))
         """
-        return -torch.mean(torch.log(policy) * advantages)
+        log_policy = F.log_softmax(logits, dim=1)
+        log_prob = log_policy.gather(1, actions.unsqueeze(1)).squeeze(1)
+        return -(log_prob * advantages).mean()
     
     def value_loss(self, values, rewards):
         """
@@ -172,17 +228,28 @@ class Training:
         """
         Combined loss with regularization
         """
-        l2_reg = torch.sum(torch.tensor([p.norm(2) for p in parameters]))
+        # ||θ||² accumulated on-device so it stays in the autograd graph
+        l2_reg = torch.zeros((), device=policy_loss.device)
+        for p in parameters:
+            l2_reg = l2_reg + p.pow(2).sum()
         return policy_loss + c1 * value_loss + c2 * l2_reg
 
 if __name__ == "__main__":
     # Initialize components
     state_space = StateSpace()
     action_space = ActionSpace()
-    network = HIVNeuralNetwork(state_space.TOTAL_DIM, action_space.HIV_ACTIONS)
+    network = build_network(state_space.TOTAL_DIM, action_space.HIV_ACTIONS)
     reward_function = RewardFunction()
     training = Training()
     
     print("HIV Neural Framework Initialized")
     print(f"State Space Dimension: {state_space.TOTAL_DIM}")
-    print(f"Action Space Dimension: {action_space.HIV_ACTIONS}")
\ No newline at end of file
+    print(f"Action Space Dimension: {action_space.HIV_ACTIONS}")
+    
+    # Mixed-precision inference on a single state
+    device_type = "cuda" if torch.cuda.is_available() else "cpu"
+    network.to(device_type)
+    state = torch.randn(1, state_space.TOTAL_DIM, device=device_type)
+    with torch.no_grad(), training.autocast(device_type):
+        logits, value = network(state)
+    print(f"State value estimate: {value.item():.3f}")
\ No newline at end of file
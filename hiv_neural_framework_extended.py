@@ -1,53 +1,74 @@
+import math
+import os
 import torch
+import torch.distributed as dist
 import torch.nn as nn
+from torch.distributions import Categorical
+from torch.nn.parallel import DistributedDataParallel as DDP
 import numpy as np
+from scipy.special import expit
 from dataclasses import dataclass
 from typing import Dict, List, Tuple
-from enum import Enum
 
-class MolecularFeatures(Enum):
-    """
-    Enumeration of molecular features mapped to state space
-    """
-    # T-Cell Features (64 protein + 32 membrane + 32 vesicle = 128)
-    CD4_DENSITY = "cd4_receptor_density"  # surface density of CD4 receptors
-    MEMBRANE_FLUIDITY = "membrane_fluidity"  # lipid bilayer characteristics
-    CORECEPTOR_STATUS = "coreceptor_status"  # CCR5/CXCR4 availability
-    VESICLE_COUNT = "vesicle_count"  # number of transport vesicles
-    ATP_LEVEL = "atp_concentration"  # cellular energy state
-    
-    # HIV Features (64 surface + 32 RNA + 32 binding = 128)
-    ENV_PROTEIN_STATE = "env_protein_conformation"  # gp120/gp41 state
-    RNA_INTEGRITY = "viral_rna_integrity"  # genetic material state
-    REVERSE_TRANSCRIPTASE = "rt_activity"  # enzyme activity level
-    CAPSID_STABILITY = "capsid_stability"  # viral core integrity
-    
-    # Immune Features (64 antibody + 32 recognition + 32 attack = 128)
-    ANTIBODY_SPECIFICITY = "antibody_binding_sites"  # binding characteristics
-    MEMORY_CELL_STATUS = "immune_memory_state"  # learned responses
-    CYTOKINE_LEVELS = "cytokine_concentration"  # immune signaling
+# One shared feature enum and vector layout across modules, so feature ids
+# index the same slot everywhere (IntEnum members compare as plain ints)
+from hiv_molecular_features import MolecularFeatures, N_FEATURES
+
+def _feature_vector(entries: Dict[MolecularFeatures, float], fill: float = 0.0) -> np.ndarray:
+    """Dense float32 array indexed by MolecularFeatures, `fill` where absent"""
+    vector = np.full(N_FEATURES, fill, dtype=np.float32)
+    for feature, value in entries.items():
+        vector[feature] = value
+    return vector
+
+def _weighted_score(weights: np.ndarray, features: np.ndarray) -> float:
+    """Weighted sum over the features that are set; NaN marks an unset feature"""
+    return float(np.nansum(weights * features))
+
+def _batch_probability(weights: np.ndarray, feature_matrix: np.ndarray) -> np.ndarray:
+    """Row-wise logistic of the weighted score; `feature_matrix` must be NaN-free"""
+    return expit(feature_matrix @ weights)
+
+def _sigmoid(x: float) -> float:
+    """Scalar logistic without building a tensor; exp never overflows"""
+    if x >= 0.0:
+        return 1.0 / (1.0 + math.exp(-x))
+    z = math.exp(x)
+    return z / (1.0 + z)
+
+# Biological constraint bounds, shared by every MolecularState (read-only)
+_CONSTRAINTS_LO = _feature_vector({
+    MolecularFeatures.CD4_DENSITY: 0,  # receptors/μm²
+    MolecularFeatures.MEMBRANE_FLUIDITY: 0.1,  # relative scale
+    MolecularFeatures.ATP_LEVEL: 1  # mM
+}, fill=-np.inf)
+_CONSTRAINTS_HI = _feature_vector({
+    MolecularFeatures.CD4_DENSITY: 1000,
+    MolecularFeatures.MEMBRANE_FLUIDITY: 1.0,
+    MolecularFeatures.ATP_LEVEL: 10
+}, fill=np.inf)
+_CONSTRAINTS_LO.flags.writeable = False
+_CONSTRAINTS_HI.flags.writeable = False
 
 @dataclass
 class MolecularState:
     """
     Detailed molecular state representation with biological constraints
+    
+    Unset features hold NaN: validation skips them and reward scores treat
+    them as contributing nothing
     """
+    lo = _CONSTRAINTS_LO
+    hi = _CONSTRAINTS_HI
+
     def __init__(self):
-        self.features: Dict[MolecularFeatures, float] = {}
-        self.constraints = {
-            MolecularFeatures.CD4_DENSITY: (0, 1000),  # receptors/μm²
-            MolecularFeatures.MEMBRANE_FLUIDITY: (0.1, 1.0),  # relative scale
-            MolecularFeatures.ATP_LEVEL: (1, 10)  # mM
-        }
+        self.features = np.full(N_FEATURES, np.nan, dtype=np.float32)
     
     def validate_state(self) -> bool:
         """Ensures biological constraints are met"""
-        return all(
-            self.constraints.get(feature, (float('-inf'), float('inf')))[0] 
-            <= value <= 
-            self.constraints.get(feature, (float('-inf'), float('inf')))[1]
-            for feature, value in self.features.items()
-        )
+        # NaN compares False both ways, so unset features never violate
+        features = self.features
+        return not ((features < self.lo) | (features > self.hi)).any()
 
 class ChessMolecularAction:
     """
@@ -84,9 +105,87 @@ class ChessMolecularAction:
             "spatial_constraints": (1, 100)  # nanometers
         }
 
+@torch.jit.script
+def gae_scan(
+    rewards: torch.Tensor,
+    values: torch.Tensor,
+    dones: torch.Tensor,
+    gamma: float,
+    lam: float,
+    advantages: torch.Tensor
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """
+    Generalized Advantage Estimation over one rollout
+    Every slot of `advantages` is overwritten, so it may be uninitialized
+    Returns: (advantages, returns)
+    """
+    # One-step TD residuals for every timestep at once; the episode mask
+    # and the gamma * lam factor are each computed a single time
+    not_done = 1.0 - dones
+    gamma_lam = gamma * lam
+    next_values = torch.cat([values[1:], torch.zeros_like(values[:1])])
+    deltas = rewards + gamma * next_values * not_done - values
+    discounts = gamma_lam * not_done
+    
+    # Backward scan touches only pre-computed device tensors
+    gae = torch.zeros_like(rewards[0])
+    for t in range(rewards.size(0) - 1, -1, -1):
+        gae = deltas[t] + discounts[t] * gae
+        advantages[t] = gae
+    
+    return advantages, advantages + values
+
+@torch.jit.script
+def ppo_losses(
+    new_log_probs: torch.Tensor,
+    entropy: torch.Tensor,
+    new_values: torch.Tensor,
+    old_log_probs: torch.Tensor,
+    advantages: torch.Tensor,
+    returns: torch.Tensor,
+    clip_eps: float,
+    value_coef: float,
+    entropy_coef: float
+) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor]:
+    """
+    PPO clipped-objective losses from the current policy's action
+    log-probabilities and per-sample entropy
+    Returns: (policy_loss, value_loss, entropy_loss, total_loss)
+    """
+    # Compute policy ratio and clipped objective
+    ratio = torch.exp(new_log_probs - old_log_probs)
+    clipped_ratio = torch.clamp(ratio, 1 - clip_eps, 1 + clip_eps)
+    
+    # Compute losses
+    policy_loss = -torch.min(
+        ratio * advantages,
+        clipped_ratio * advantages
+    ).mean()
+    
+    value_loss = 0.5 * (returns - new_values).pow(2).mean()
+    entropy_loss = entropy.mean()
+    
+    # Compute total loss
+    total_loss = (
+        policy_loss +
+        value_coef * value_loss -
+        entropy_coef * entropy_loss
+    )
+    
+    return policy_loss, value_loss, entropy_loss, total_loss
+
 class PPOTrainer:
     """
     Proximal Policy Optimization implementation for HIV chess
+    
+    `network(states)` must return (policy logits, values); log-probabilities
+    and entropy come from a Categorical over the logits
+    
+    When the caller has initialized a process group (e.g. a torchrun launch
+    calling dist.init_process_group) the network is wrapped in
+    DistributedDataParallel on LOCAL_RANK, so gradients are all-reduced
+    during backward; each rank feeds its own rollouts, collected from an
+    environment seeded with rank_seed
     """
     def __init__(
         self,
@@ -94,13 +193,68 @@ class PPOTrainer:
         learning_rate: float = 3e-4,
         clip_epsilon: float = 0.2,
         value_coef: float = 0.5,
-        entropy_coef: float = 0.01
+        entropy_coef: float = 0.01,
+        compile_network: bool = True,
+        use_amp: bool = True,
+        cpu_amp: bool = False
     ):
         self.network = network
+        self.local_rank = int(os.environ.get("LOCAL_RANK", 0))
+        if dist.is_available() and dist.is_initialized():
+            if torch.cuda.is_available():
+                network.to(torch.device("cuda", self.local_rank))
+                self.network = DDP(network, device_ids=[self.local_rank])
+            else:
+                self.network = DDP(network)
+        if compile_network and hasattr(torch, "compile"):
+            # Fuse the policy/value forward; the optimizer step stays eager.
+            # Rollouts should keep batch shapes fixed to avoid recompiles.
+            torch._dynamo.config.cache_size_limit = 128
+            self.network = torch.compile(self.network, mode="reduce-overhead", fullgraph=False)
         self.optimizer = torch.optim.Adam(network.parameters(), lr=learning_rate)
         self.clip_epsilon = clip_epsilon
         self.value_coef = value_coef
         self.entropy_coef = entropy_coef
+        # Advantage buffer reused across epochs while the rollout shape holds
+        self._adv_buf = None
+        # bf16 autocast keeps fp32's exponent range, so no GradScaler is needed.
+        # On by default only for CUDA devices with native bf16; CPU bf16 is
+        # opt-in via cpu_amp since it trades precision and is often slower
+        self.use_amp = use_amp
+        self.cpu_amp = cpu_amp
+        self._cuda_bf16 = torch.cuda.is_available() and torch.cuda.is_bf16_supported()
+        # Device the network trains on; rollouts are collected on the host
+        self.device = next(network.parameters()).device
+
+    def allocate_rollout(self, length: int, state_dim: int) -> Dict[str, torch.Tensor]:
+        """
+        Host-side rollout buffers for `length` environment steps, in page-locked
+        memory when training on a GPU so to_device can copy asynchronously
+        """
+        pin = self.device.type == "cuda"
+        shapes = {
+            "states": (length, state_dim),
+            "log_probs": (length, 1),
+            "rewards": (length,),
+            "values": (length,),
+            "dones": (length,),
+        }
+        rollout = {
+            name: torch.empty(shape, dtype=torch.float32, pin_memory=pin)
+            for name, shape in shapes.items()
+        }
+        rollout["actions"] = torch.empty((length, 1), dtype=torch.long, pin_memory=pin)
+        return rollout
+
+    def to_device(self, rollout: Dict[str, torch.Tensor]) -> Dict[str, torch.Tensor]:
+        """
+        Queue non-blocking host-to-device copies of a rollout; kernels issued
+        afterwards on the same stream are ordered behind them
+        """
+        return {
+            name: tensor.to(self.device, non_blocking=True)
+            for name, tensor in rollout.items()
+        }
 
     def compute_gae(
         self,
@@ -112,22 +266,14 @@ class PPOTrainer:
     ) -> Tuple[torch.Tensor, torch.Tensor]:
         """
         Compute Generalized Advantage Estimation
+        The returned advantages alias an internal buffer that the next call
+        overwrites; clone them to keep them across calls
         """
-        advantages = torch.zeros_like(rewards)
-        gae = 0
-        
-        for t in reversed(range(len(rewards))):
-            if t == len(rewards) - 1:
-                next_value = 0
-            else:
-                next_value = values[t + 1]
-            
-            delta = rewards[t] + gamma * next_value * (1 - dones[t]) - values[t]
-            gae = delta + gamma * lam * (1 - dones[t]) * gae
-            advantages[t] = gae
-            
-        returns = advantages + values
-        return advantages, returns
+        buf = self._adv_buf
+        if (buf is None or buf.shape != rewards.shape
+                or buf.dtype != rewards.dtype or buf.device != rewards.device):
+            buf = self._adv_buf = torch.empty_like(rewards)
+        return gae_scan(rewards, values, dones, gamma, lam, buf)
 
     def update_policy(
         self,
@@ -140,40 +286,37 @@ class PPOTrainer:
         """
         Update policy using PPO clipped objective
         """
-        # Get current policy and value predictions
-        new_policy, new_values = self.network(states)
-        new_log_probs = torch.log(new_policy.gather(1, actions))
-        
-        # Compute policy ratio and clipped objective
-        ratio = torch.exp(new_log_probs - old_log_probs)
-        clipped_ratio = torch.clamp(
-            ratio,
-            1 - self.clip_epsilon,
-            1 + self.clip_epsilon
-        )
+        device_type = states.device.type
+        if device_type == "cuda":
+            amp = self.use_amp and self._cuda_bf16
+        else:
+            amp = self.use_amp and self.cpu_amp and device_type == "cpu"
         
-        # Compute losses
-        policy_loss = -torch.min(
-            ratio * advantages,
-            clipped_ratio * advantages
-        ).mean()
-        
-        value_loss = 0.5 * (returns - new_values).pow(2).mean()
-        entropy_loss = -torch.mean(
-            torch.sum(new_policy * torch.log(new_policy + 1e-10), dim=-1)
-        )
-        
-        # Compute total loss
-        total_loss = (
-            policy_loss +
-            self.value_coef * value_loss -
-            self.entropy_coef * entropy_loss
-        )
+        # Forward and loss under bf16 autocast; backward runs outside it
+        with torch.autocast(device_type=device_type, dtype=torch.bfloat16, enabled=amp):
+            # Get current policy and value predictions
+            logits, new_values = self.network(states)
+            policy = Categorical(logits=logits.float(), validate_args=False)
+            new_log_probs = policy.log_prob(actions.squeeze(-1)).unsqueeze(-1)
+            policy_loss, value_loss, entropy_loss, total_loss = ppo_losses(
+                new_log_probs,
+                policy.entropy(),
+                new_values,
+                old_log_probs,
+                advantages,
+                returns,
+                self.clip_epsilon,
+                self.value_coef,
+                self.entropy_coef
+            )
         
         # Update network
         self.optimizer.zero_grad()
         total_loss.backward()
-        torch.nn.utils.clip_grad_norm_(self.network.parameters(), 0.5)
+        # Fused multi-tensor norm on GPU; older releases reject foreach on CPU
+        torch.nn.utils.clip_grad_norm_(
+            self.network.parameters(), 0.5, foreach=self.device.type == "cuda"
+        )
         self.optimizer.step()
         
         return {
@@ -188,17 +331,32 @@ class MolecularRewardCalculator:
     Calculates rewards based on molecular state transitions
     """
     def __init__(self):
-        self.survival_weights = {
+        self.survival_weights = _feature_vector({
             MolecularFeatures.ENV_PROTEIN_STATE: 0.4,
             MolecularFeatures.CAPSID_STABILITY: 0.3,
             MolecularFeatures.ATP_LEVEL: 0.3
-        }
+        })
         
-        self.evasion_weights = {
+        self.evasion_weights = _feature_vector({
             MolecularFeatures.ANTIBODY_SPECIFICITY: -0.5,
             MolecularFeatures.MEMBRANE_FLUIDITY: 0.3,
             MolecularFeatures.VESICLE_COUNT: 0.2
-        }
+        })
+        
+        # Detection score is the mean of the immune features
+        immune_features = [
+            MolecularFeatures.ANTIBODY_SPECIFICITY,
+            MolecularFeatures.MEMORY_CELL_STATUS,
+            MolecularFeatures.CYTOKINE_LEVELS
+        ]
+        self.detection_weights = _feature_vector({
+            feature: 1.0 / len(immune_features) for feature in immune_features
+        })
+        
+        # (N_FEATURES, 3) so one matmul scores survival, evasion and detection
+        self._stacked_weights = np.stack(
+            [self.survival_weights, self.evasion_weights, self.detection_weights], axis=1
+        )
 
     def calculate_survival_probability(
         self,
@@ -207,11 +365,8 @@ class MolecularRewardCalculator:
         """
         Calculate P(survival) based on molecular features
         """
-        survival_score = sum(
-            self.survival_weights.get(feature, 0) * value
-            for feature, value in molecular_state.features.items()
-        )
-        return torch.sigmoid(torch.tensor(survival_score)).item()
+        survival_score = _weighted_score(self.survival_weights, molecular_state.features)
+        return _sigmoid(survival_score)
 
     def calculate_evasion_probability(
         self,
@@ -220,11 +375,8 @@ class MolecularRewardCalculator:
         """
         Calculate P(immune_evasion) based on molecular features
         """
-        evasion_score = sum(
-            self.evasion_weights.get(feature, 0) * value
-            for feature, value in molecular_state.features.items()
-        )
-        return torch.sigmoid(torch.tensor(evasion_score)).item()
+        evasion_score = _weighted_score(self.evasion_weights, molecular_state.features)
+        return _sigmoid(evasion_score)
 
     def calculate_detection_probability(
         self,
@@ -233,18 +385,41 @@ class MolecularRewardCalculator:
         """
         Calculate P(detection) based on immune system state
         """
-        immune_features = [
-            MolecularFeatures.ANTIBODY_SPECIFICITY,
-            MolecularFeatures.MEMORY_CELL_STATUS,
-            MolecularFeatures.CYTOKINE_LEVELS
-        ]
-        
-        detection_score = sum(
-            molecular_state.features.get(feature, 0)
-            for feature in immune_features
-        ) / len(immune_features)
-        
-        return torch.sigmoid(torch.tensor(detection_score)).item()
+        detection_score = _weighted_score(self.detection_weights, molecular_state.features)
+        return _sigmoid(detection_score)
+
+    def calculate_survival_probability_batch(self, feature_matrix: np.ndarray) -> np.ndarray:
+        """
+        P(survival) for a (N, N_FEATURES) stack of feature vectors
+        Returns: array of shape (N,)
+        """
+        return _batch_probability(self.survival_weights, np.nan_to_num(feature_matrix, nan=0.0))
+
+    def calculate_evasion_probability_batch(self, feature_matrix: np.ndarray) -> np.ndarray:
+        """
+        P(immune_evasion) for a (N, N_FEATURES) stack of feature vectors
+        Returns: array of shape (N,)
+        """
+        return _batch_probability(self.evasion_weights, np.nan_to_num(feature_matrix, nan=0.0))
+
+    def calculate_detection_probability_batch(self, feature_matrix: np.ndarray) -> np.ndarray:
+        """
+        P(detection) for a (N, N_FEATURES) stack of feature vectors
+        Returns: array of shape (N,)
+        """
+        return _batch_probability(self.detection_weights, np.nan_to_num(feature_matrix, nan=0.0))
+
+    def calculate_probabilities_batch(
+        self,
+        feature_matrix: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        P(survival), P(immune_evasion), P(detection) for a (N, N_FEATURES) stack,
+        cleaning NaNs once and scoring all three in a single matmul
+        Returns: three arrays of shape (N,)
+        """
+        probabilities = _batch_probability(self._stacked_weights, np.nan_to_num(feature_matrix, nan=0.0))
+        return tuple(probabilities.T)
 
     def calculate_resource_cost(
         self,
@@ -258,13 +433,21 @@ class MolecularRewardCalculator:
             action, {"energy_cost": 0}
         )["energy_cost"]
         
-        # Scale cost based on ATP availability
-        atp_level = molecular_state.features.get(
-            MolecularFeatures.ATP_LEVEL,
-            5.0
-        )
+        # Scale cost based on ATP availability, 5 mM when unset
+        atp_level = float(molecular_state.features[MolecularFeatures.ATP_LEVEL])
+        if math.isnan(atp_level):
+            atp_level = 5.0
         return base_cost * (1.0 / atp_level)
 
+def rank_seed(base_seed: int) -> int:
+    """
+    Disjoint per-rank seed for rollout collection; uses torchrun's RANK when
+    the worker has not joined a process group
+    """
+    if dist.is_available() and dist.is_initialized():
+        return base_seed + dist.get_rank()
+    return base_seed + int(os.environ.get("RANK", 0))
+
 if __name__ == "__main__":
     # Initialize components
     molecular_state = MolecularState()
@@ -272,12 +455,12 @@ if __name__ == "__main__":
     reward_calculator = MolecularRewardCalculator()
     
     # Example molecular state
-    molecular_state.features = {
+    molecular_state.features = _feature_vector({
         MolecularFeatures.CD4_DENSITY: 500,
         MolecularFeatures.MEMBRANE_FLUIDITY: 0.7,
         MolecularFeatures.ATP_LEVEL: 5,
         MolecularFeatures.ENV_PROTEIN_STATE: 0.8
-    }
+    }, fill=np.nan)
     
     # Validate and calculate rewards
     if molecular_state.validate_state():
@@ -4,6 +4,8 @@ import numpy as np
 import torch
 from enum import Enum
 
+from hiv_molecular_features import MolecularFeatures, MolecularState, njit
+
 @dataclass
 class TransitionRule:
     """
@@ -20,15 +22,82 @@ class TransitionRule:
     source: str
     confidence: str  # "high", "medium", "low", "estimated"
 
+# Feature indices baked into the compiled rule kernel
+_ATP = int(MolecularFeatures.ATP_LEVEL)
+_MEMBRANE = int(MolecularFeatures.MEMBRANE_FLUIDITY)
+_POPULATION_FEATURES = (MolecularFeatures.VIRAL_LOAD, MolecularFeatures.CD4_DENSITY)
+
+def _compile_rules(transition_rules: Dict[str, Dict[str, TransitionRule]]):
+    """
+    Lower the primary transition rules to parallel arrays for the kernel
+    Returns: ({action_name: rule_id}, (target_idx, effect_mag, exp_scaled,
+             side_idx, side_mag, side_prob)); unused side slots hold -1
+    """
+    names = list(transition_rules)
+    rules = [transition_rules[name]["primary"] for name in names]
+    n_rules = len(rules)
+    max_side = max([len(rule.side_effects) for rule in rules] + [1])
+    
+    target_idx = np.array([int(rule.target_feature) for rule in rules], dtype=np.int64)
+    effect_mag = np.array([rule.effect_magnitude for rule in rules], dtype=np.float64)
+    exp_scaled = np.array(
+        [rule.target_feature in _POPULATION_FEATURES for rule in rules], dtype=np.bool_
+    )
+    side_idx = np.full((n_rules, max_side), -1, dtype=np.int64)
+    side_mag = np.zeros((n_rules, max_side), dtype=np.float64)
+    side_prob = np.zeros((n_rules, max_side), dtype=np.float64)
+    for rule_id, rule in enumerate(rules):
+        for k, (feature, effect_info) in enumerate(rule.side_effects.items()):
+            side_idx[rule_id, k] = int(feature)
+            side_mag[rule_id, k] = effect_info["magnitude"]
+            side_prob[rule_id, k] = effect_info["probability"]
+    
+    rule_ids = {name: rule_id for rule_id, name in enumerate(names)}
+    return rule_ids, (target_idx, effect_mag, exp_scaled, side_idx, side_mag, side_prob)
+
+# No on-disk cache: this script is loaded by path, and Numba reloads cached
+# kernels by importing their module by name
+@njit
+def _apply_rule(rule_id, features, lows, highs, side_u, required_energy,
+                target_idx, effect_mag, exp_scaled, side_idx, side_mag, side_prob):
+    """
+    Apply a successful rule to `features` in place: primary effect, each
+    side effect whose draw in `side_u` falls below its probability, then
+    the energy cost
+    """
+    # Apply primary effect with biological constraints
+    target = target_idx[rule_id]
+    current = features[target]
+    effect = effect_mag[rule_id]
+    if exp_scaled[rule_id]:
+        # Use exponential scaling for population-based features
+        effect = current * (np.exp(effect) - 1)
+    features[target] = min(max(current + effect, lows[target]), highs[target])
+    
+    # Apply side effects with biological dependencies
+    for k in range(side_idx.shape[1]):
+        feature = side_idx[rule_id, k]
+        if feature < 0:
+            break
+        if side_u[k] < side_prob[rule_id, k]:
+            magnitude = side_mag[rule_id, k]
+            if feature == _MEMBRANE:
+                # Temperature-dependent scaling
+                magnitude *= (1 + 0.1 * (features[_ATP] - 5))
+            features[feature] = min(max(features[feature] + magnitude, lows[feature]), highs[feature])
+    
+    # Update energy state
+    features[_ATP] -= required_energy
+
 class HIVMolecularEnvironment:
     """
     Refined simulation environment with biologically validated parameters
     """
     
     def __init__(self, random_seed: Optional[int] = None):
-        self.state = MolecularState(random_init=True)
+        self.rng = np.random.default_rng(random_seed)
+        self.state = MolecularState(random_init=True, rng=self.rng)
         self.reward_calculator = EnhancedMolecularRewardCalculator()
-        self.rng = np.random.RandomState(random_seed)
         self.step_count = 0
         self.max_steps = 1000
         
@@ -91,6 +160,9 @@ class HIVMolecularEnvironment:
             
             # Additional refined actions...
         }
+        
+        # Rules as parallel arrays, dispatched by id to the compiled kernel
+        self._rule_ids, self._rule_table = _compile_rules(self.transition_rules)
 
     def _apply_action_effects(
         self,
@@ -105,7 +177,7 @@ class HIVMolecularEnvironment:
         
         # Check energy availability
         required_energy = rule.energy_cost * self.ATP_CONVERSION
-        current_energy = current_state.features[MolecularFeatures.ATP_LEVEL]
+        current_energy = current_state.values[MolecularFeatures.ATP_LEVEL]
         
         if current_energy < required_energy:
             return current_state, False, {
@@ -116,8 +188,8 @@ class HIVMolecularEnvironment:
         base_probability = rule.probability
         
         # Modify probability based on cellular conditions
-        membrane_factor = current_state.features[MolecularFeatures.MEMBRANE_FLUIDITY]
-        atp_factor = current_state.features[MolecularFeatures.ATP_LEVEL]
+        membrane_factor = current_state.values[MolecularFeatures.MEMBRANE_FLUIDITY]
+        atp_factor = current_state.values[MolecularFeatures.ATP_LEVEL]
         
         adjusted_probability = base_probability * \
                              (0.5 + 0.5 * membrane_factor) * \
@@ -136,61 +208,22 @@ class HIVMolecularEnvironment:
         if not success:
             return current_state, False, effect_metrics
         
-        # Create new state with primary effect
+        # Create new state and apply the rule's effects to it
         new_state = MolecularState()
-        new_state.features = current_state.features.copy()
-        
-        # Apply primary effect with biological constraints
-        self._apply_primary_effect(rule, new_state)
-        
-        # Apply side effects with biological dependencies
-        self._apply_side_effects(rule, new_state)
-        
-        # Update energy state
-        new_state.features[MolecularFeatures.ATP_LEVEL] -= required_energy
+        new_state.values[:] = current_state.values
+        side_u = self.rng.random(self._rule_table[3].shape[1])
+        _apply_rule(
+            self._rule_ids[action_name],
+            new_state.values,
+            new_state.LOWS,
+            new_state.HIGHS,
+            side_u,
+            required_energy,
+            *self._rule_table
+        )
         
         return new_state, True, effect_metrics
 
-    def _apply_primary_effect(self, rule: TransitionRule, state: MolecularState):
-        """Apply primary effect with biological constraints"""
-        target = rule.target_feature
-        current = state.features[target]
-        effect = rule.effect_magnitude
-        
-        # Scale effect based on current state
-        if target in [MolecularFeatures.VIRAL_LOAD, MolecularFeatures.CD4_DENSITY]:
-            # Use exponential scaling for population-based features
-            effect = current * (np.exp(effect) - 1)
-        
-        new_value = current + effect
-        
-        # Apply constraints
-        if target in state.constraints:
-            min_val, max_val = state.constraints[target]["range"]
-            new_value = np.clip(new_value, min_val, max_val)
-        
-        state.features[target] = new_value
-
-    def _apply_side_effects(self, rule: TransitionRule, state: MolecularState):
-        """Apply side effects with biological dependencies"""
-        for feature, effect_info in rule.side_effects.items():
-            if self.rng.random() < effect_info["probability"]:
-                current = state.features[feature]
-                magnitude = effect_info["magnitude"]
-                
-                # Scale side effects based on biological relationships
-                if feature == MolecularFeatures.MEMBRANE_FLUIDITY:
-                    # Temperature-dependent scaling
-                    magnitude *= (1 + 0.1 * (state.features[MolecularFeatures.ATP_LEVEL] - 5))
-                
-                new_value = current + magnitude
-                
-                if feature in state.constraints:
-                    min_val, max_val = state.constraints[feature]["range"]
-                    new_value = np.clip(new_value, min_val, max_val)
-                
-                state.features[feature] = new_value
-
 class EnhancedMolecularRewardCalculator:
     """
     Enhanced reward calculation with biological basis
@@ -226,8 +259,8 @@ class EnhancedMolecularRewardCalculator:
 
     def _calculate_viral_fitness(self, state: MolecularState) -> float:
         """Calculate viral fitness based on key features"""
-        viral_load = state.features[MolecularFeatures.VIRAL_LOAD]
-        env_state = state.features[MolecularFeatures.ENV_PROTEIN_STATE]
+        viral_load = state.values[MolecularFeatures.VIRAL_LOAD]
+        env_state = state.values[MolecularFeatures.ENV_PROTEIN_STATE]
         
         # Nonlinear fitness function based on viral load and protein state
         fitness = np.log10(1 + viral_load) * (0.5 + 0.5 * env_state)
@@ -235,8 +268,8 @@ class EnhancedMolecularRewardCalculator:
 
     def _calculate_immune_evasion(self, state: MolecularState) -> float:
         """Calculate immune evasion success"""
-        antibody_spec = state.features[MolecularFeatures.ANTIBODY_SPECIFICITY]
-        memory_state = state.features[MolecularFeatures.MEMORY_CELL_STATUS]
+        antibody_spec = state.values[MolecularFeatures.ANTIBODY_SPECIFICITY]
+        memory_state = state.values[MolecularFeatures.MEMORY_CELL_STATUS]
         
         # Higher values indicate better evasion
         evasion = 1 - (0.6 * antibody_spec + 0.4 * memory_state)
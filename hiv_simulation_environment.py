@@ -1,10 +1,10 @@
 from dataclasses import dataclass
 from typing import Dict, List, Tuple, Optional
 import numpy as np
-from enum import Enum
+from enum import IntEnum
 
 from hiv_molecular_features import MolecularFeatures, MolecularState
-from hiv_neural_framework_extended import ChessMolecularAction, MolecularRewardCalculator
+from hiv_neural_framework_extended import MolecularRewardCalculator, rank_seed
 
 @dataclass
 class TransitionRule:
@@ -19,6 +19,12 @@ class TransitionRule:
     # Source documentation for transition parameters
     source: str
 
+class ActionID(IntEnum):
+    """Integer action ids; lower-cased names key transition_rules"""
+    QUEEN_DIAGONAL = 0
+    BISHOP_MOVE = 1
+    KNIGHT_JUMP = 2
+
 class HIVMolecularEnvironment:
     """
     Simulation environment for HIV molecular chess game
@@ -28,11 +34,24 @@ class HIVMolecularEnvironment:
     [2] Johnson et al. 2023, Cell - T-cell energy metabolism
     [3] Williams et al. 2024, Immunity - HIV mutation rates
     """
+    UNIFORM_BLOCK = 4096
     
     def __init__(self, random_seed: Optional[int] = None):
-        self.state = MolecularState(random_init=True)
+        # One seeded generator drives both initial states and success rolls
+        self.rng = np.random.default_rng(random_seed)
+        # Double-buffered states: each step writes the inactive one, so a
+        # returned state stays valid only until the step after next
+        self._states = (MolecularState(), MolecularState())
+        self._active = 0
+        self.state = self._states[0]
+        self.state.initialize_random_state(self.rng)
+        # Critical thresholds checked every step, resolved once
+        self._atp_crit = float(MolecularState.CRITICAL[MolecularFeatures.ATP_LEVEL])
+        self._cd4_crit = float(MolecularState.CRITICAL[MolecularFeatures.CD4_DENSITY])
         self.reward_calculator = MolecularRewardCalculator()
-        self.rng = np.random.RandomState(random_seed)
+        # Success rolls are drawn in blocks and consumed one per step
+        self._uniforms = self.rng.random(self.UNIFORM_BLOCK)
+        self._uniform_pos = 0
         self.step_count = 0
         self.max_steps = 1000  # Maximum episode length
         
@@ -83,75 +102,96 @@ class HIVMolecularEnvironment:
                 )
             }
         }
+        # Rules indexed by ActionID for integer dispatch in step
+        self._rules_list: List[TransitionRule] = [
+            self.transition_rules[action.name.lower()]["primary"] for action in ActionID
+        ]
+        # Side effects per rule as (indices, magnitudes, lows, highs) so a
+        # rule's whole group updates with one clip
+        self._side_effects = []
+        for rule in self._rules_list:
+            idx = np.fromiter(rule.side_effects.keys(), dtype=np.intp)
+            self._side_effects.append((
+                idx,
+                np.fromiter(rule.side_effects.values(), dtype=np.float64),
+                MolecularState.LOWS[idx],
+                MolecularState.HIGHS[idx],
+            ))
     
     def reset(self) -> MolecularState:
         """Initialize new episode"""
-        self.state = MolecularState(random_init=True)
+        # Flip buffers like a step, so the last returned state stays intact
+        self._active ^= 1
+        self.state = self._states[self._active]
+        self.state.initialize_random_state(self.rng)
         self.step_count = 0
         return self.state
     
+    def _next_uniform(self) -> float:
+        """Next U[0, 1) draw from the pre-drawn block"""
+        if self._uniform_pos == self.UNIFORM_BLOCK:
+            self.rng.random(out=self._uniforms)
+            self._uniform_pos = 0
+        u = self._uniforms[self._uniform_pos]
+        self._uniform_pos += 1
+        return u
+
     def _apply_action_effects(
         self,
-        action_name: str,
+        action_id: int,
         current_state: MolecularState
     ) -> Tuple[MolecularState, bool]:
         """
         Apply action effects to current state
         Returns: (new_state, success)
         """
-        if action_name not in self.transition_rules:
-            raise ValueError(f"Unknown action: {action_name}")
-            
-        rule = self.transition_rules[action_name]["primary"]
-        success = self.rng.random() < rule.probability
+        # Range check first: negative ids would otherwise index from the end
+        if not 0 <= action_id < len(self._rules_list):
+            raise ValueError(f"Unknown action: {action_id}")
+        rule = self._rules_list[action_id]
+
+        success = self._next_uniform() < rule.probability
         
-        new_state = MolecularState()
-        new_state.features = current_state.features.copy()
+        self._active ^= 1
+        new_state = self._states[self._active]
+        np.copyto(new_state.values, current_state.values)
         
         if success:
             # Apply primary effect
-            target_feature = rule.target_feature
-            current_value = new_state.features.get(target_feature, 0.0)
-            new_value = current_value + rule.effect_magnitude
+            target = rule.target_feature
+            new_value = new_state.values[target] + rule.effect_magnitude
             
             # Ensure value stays within constraints
-            if target_feature in new_state.constraints:
-                min_val, max_val = new_state.constraints[target_feature]["range"]
-                new_value = np.clip(new_value, min_val, max_val)
-            
-            new_state.features[target_feature] = new_value
+            new_state.values[target] = np.clip(
+                new_value,
+                new_state.LOWS[target],
+                new_state.HIGHS[target]
+            )
             
-            # Apply side effects
-            for feature, magnitude in rule.side_effects.items():
-                current_value = new_state.features.get(feature, 0.0)
-                new_value = current_value + magnitude
-                
-                if feature in new_state.constraints:
-                    min_val, max_val = new_state.constraints[feature]["range"]
-                    new_value = np.clip(new_value, min_val, max_val)
-                
-                new_state.features[feature] = new_value
+            # Apply side effects (distinct features, so one fused clip)
+            idx, magnitudes, lows, highs = self._side_effects[action_id]
+            new_state.values[idx] = np.clip(new_state.values[idx] + magnitudes, lows, highs)
             
             # Apply energy cost
-            current_atp = new_state.features.get(MolecularFeatures.ATP_LEVEL, 5.0)
-            new_atp = current_atp - rule.energy_cost / 100  # Scale energy cost
-            new_state.features[MolecularFeatures.ATP_LEVEL] = np.clip(
+            atp = MolecularFeatures.ATP_LEVEL
+            new_atp = new_state.values[atp] - rule.energy_cost / 100  # Scale energy cost
+            new_state.values[atp] = np.clip(
                 new_atp,
-                new_state.constraints[MolecularFeatures.ATP_LEVEL]["range"][0],
-                new_state.constraints[MolecularFeatures.ATP_LEVEL]["range"][1]
+                new_state.LOWS[atp],
+                new_state.HIGHS[atp]
             )
         
         return new_state, success
     
     def step(
         self,
-        action: ChessMolecularAction
+        action_id: int
     ) -> Tuple[MolecularState, float, bool, Dict]:
         """
         Execute one time step within the environment
         
         Args:
-            action: ChessMolecularAction to execute
+            action_id: ActionID of the move to execute
             
         Returns:
             observation: Next state
@@ -163,16 +203,12 @@ class HIVMolecularEnvironment:
         
         # Apply action effects
         new_state, action_success = self._apply_action_effects(
-            action.name,
+            action_id,
             self.state
         )
         
         # Calculate reward
-        reward = self.reward_calculator.calculate_reward(
-            new_state,
-            action,
-            action_success
-        )
+        reward = self._calculate_reward(new_state)
         
         # Check termination conditions
         done = self._check_termination(new_state)
@@ -189,21 +225,25 @@ class HIVMolecularEnvironment:
         
         return new_state, reward, done, info
     
+    def _calculate_reward(self, state: MolecularState) -> float:
+        """Reward = P(survival) + P(immune_evasion) - P(detection)"""
+        # The calculator scores (N, N_FEATURES) stacks; score this state as N=1
+        survival, evasion, detection = self.reward_calculator.calculate_probabilities_batch(
+            state.values[np.newaxis]
+        )
+        return float(survival[0] + evasion[0] - detection[0])
+    
     def _check_termination(self, state: MolecularState) -> bool:
         """Check if episode should terminate"""
         if self.step_count >= self.max_steps:
             return True
             
         # Check critical thresholds
-        if state.features.get(MolecularFeatures.ATP_LEVEL, 0) < \
-           state.constraints[MolecularFeatures.ATP_LEVEL]["critical_threshold"]:
-            return True
-            
-        if state.features.get(MolecularFeatures.CD4_DENSITY, 0) < \
-           state.constraints[MolecularFeatures.CD4_DENSITY]["critical_threshold"]:
-            return True
-        
-        return False
+        values = state.values
+        return bool(
+            values[MolecularFeatures.ATP_LEVEL] < self._atp_crit
+            or values[MolecularFeatures.CD4_DENSITY] < self._cd4_crit
+        )
     
     def render(self, mode='human'):
         """
@@ -211,20 +251,21 @@ class HIVMolecularEnvironment:
         """
         if mode == 'human':
             print("\nCurrent Molecular State:")
-            for feature, value in self.state.features.items():
+            for feature, value in zip(MolecularFeatures, self.state.values):
                 print(f"{feature.name}: {value:.3f}")
         
         return None
 
 if __name__ == "__main__":
     # Example usage
-    env = HIVMolecularEnvironment(random_seed=42)
+    # Each torchrun rank collects rollouts from its own seed
+    env = HIVMolecularEnvironment(random_seed=rank_seed(42))
     state = env.reset()
     
     # Simulate a few steps
     for _ in range(5):
-        action = ChessMolecularAction()  # You'll need to implement action selection
-        next_state, reward, done, info = env.step(action)
+        action_id = ActionID(env.rng.integers(len(ActionID)))  # Random policy
+        next_state, reward, done, info = env.step(action_id)
         env.render()
         
         if done:
@@ -1,125 +1,71 @@
-class MolecularGameTheory:
-    def __init__(self):
-        self.discovery_phase = {
-            "observation": """
-            Initial Observation:
-            - HIV molecular behaviors exhibit strategic patterns
-            - These patterns resemble game theory scenarios
-            - Molecular interactions follow predictable rule sets
-            - Energy states govern possible actions
-            """,
-            
-            "question": """
-            Research Questions:
-            1. Can molecular behavior be mapped to strategic game moves?
-            2. Do these mappings preserve the underlying biological mechanics?
-            3. Can AI predict and counter molecular strategies?
-            4. Is this framework extensible to other biological systems?
-            """,
-            
-            "background_research": {
-                "domains": [
-                    "molecular biology",
-                    "game theory",
-                    "neural networks",
-                    "complex systems",
-                    "information theory"
-                ],
-                "key_papers": [
-                    "HIV molecular dynamics studies",
-                    "Game theory in biological systems",
-                    "AI in molecular prediction",
-                    "Strategic pattern recognition"
-                ]
-            }
-        }
+import json
+import sys
+from functools import lru_cache
+from pathlib import Path
+from types import MappingProxyType
+from typing import Any, Mapping
+
+# Framework content lives in a data file next to this module
+_DATA_PATH = Path(__file__).with_name("scientific_discovery_framework.json")
+
+def _freeze(value):
+    """
+    Read-only copy of a nested structure: dicts become MappingProxyType with
+    interned keys, lists become tuples
+    """
+    if isinstance(value, dict):
+        return MappingProxyType({
+            sys.intern(key): _freeze(item) for key, item in value.items()
+        })
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+@lru_cache(maxsize=None)
+def _load() -> Mapping[str, Any]:
+    """Parse and freeze the framework content on first access only"""
+    return _freeze(json.loads(_DATA_PATH.read_text(encoding="utf-8")))
 
-        self.concept_formation = {
-            "core_concepts": {
-                "molecular_strategy": "Molecules follow optimal paths based on energy states",
-                "game_mapping": "Biological actions can be represented as strategic moves",
-                "pattern_recognition": "AI can identify and predict molecular strategies",
-                "counter_strategy": "Optimal counter-moves can be computed"
-            },
-            
-            "theoretical_framework": """
-            1. Molecular Behavior as Strategic Choice
-               - Each molecular action represents a strategic decision
-               - Energy states limit possible moves
-               - Interaction patterns form strategic sequences
-            
-            2. Game Theory Translation
-               - Molecular moves map to game actions
-               - Energy constraints map to resource management
-               - Interaction patterns map to strategic combinations
-            
-            3. Pattern Recognition and Prediction
-               - Neural networks can learn molecular strategies
-               - AI can predict likely molecular actions
-               - Counter-strategies can be computed
-            """
-        }
+# Public content constants, resolved lazily by the module __getattr__
+_CONSTANTS = {
+    "DISCOVERY_PHASE": "discovery_phase",
+    "CONCEPT_FORMATION": "concept_formation",
+    "HYPOTHESIS_FORMATION": "hypothesis_formation",
+    "EXPERIMENTAL_DESIGN": "experimental_design",
+    "VALIDATION_CRITERIA": "validation_criteria",
+}
 
-        self.hypothesis_formation = {
-            "primary_hypothesis": """
-            If molecular behaviors can be accurately mapped to strategic game moves,
-            then artificial intelligence can learn to predict and counter these moves,
-            leading to effective intervention strategies.
-            """,
-            
-            "sub_hypotheses": [
-                "H1: Molecular movements follow predictable strategic patterns",
-                "H2: These patterns can be accurately mapped to game mechanics",
-                "H3: Neural networks can learn optimal counter-strategies",
-                "H4: Game-derived solutions translate to effective interventions"
-            ],
-            
-            "testable_predictions": {
-                "P1": "AI can predict molecular movement patterns with >90% accuracy",
-                "P2": "Generated counter-strategies correspond to known effective treatments",
-                "P3": "System can identify novel intervention approaches",
-                "P4": "Framework succeeds across different molecular systems"
-            }
-        }
+def __getattr__(name):
+    try:
+        key = _CONSTANTS[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+    return _load()[key]
 
-    def experimental_design(self):
-        return """
-        Phase 1: Pattern Validation
-        - Document HIV molecular movements
-        - Classify action types
-        - Map energy requirements
-        - Identify strategic patterns
+def experimental_design():
+    return _load()["experimental_design"]
 
-        Phase 2: Game Translation
-        - Create initial game ruleset
-        - Test pattern preservation
-        - Validate energy constraints
-        - Verify strategic equivalence
+def validation_criteria():
+    return _load()["validation_criteria"]
 
-        Phase 3: Neural Network Implementation
-        - Train on molecular data
-        - Test prediction accuracy
-        - Generate counter-strategies
-        - Validate biological plausibility
+class _Section:
+    """Class attribute resolved lazily from the framework data"""
+    def __init__(self):
+        self.name = None  # set by __set_name__ when the owner class is built
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner=None):
+        return _load()[self.name]
+
+class MolecularGameTheory:
+    """Backward-compatible view over the module-level framework content"""
+    __slots__ = ()
 
-        Phase 4: Clinical Correlation
-        - Compare AI strategies with known treatments
-        - Identify novel approaches
-        - Validate intervention suggestions
-        - Document success rates
-        """
+    discovery_phase = _Section()
+    concept_formation = _Section()
+    hypothesis_formation = _Section()
 
-    def validation_criteria(self):
-        return {
-            "statistical_requirements": {
-                "pattern_recognition": ">90% accuracy",
-                "prediction_success": ">85% accuracy",
-                "strategy_effectiveness": ">80% correlation with known treatments"
-            },
-            "reproducibility_standards": [
-                "All experiments must be reproducible",
-                "Data sets must be publicly available",
-                "Methods must be fully documented",
-                "Results must be peer-reviewed"
-            ]
-        }
\ No newline at end of file
+    experimental_design = staticmethod(experimental_design)
+    validation_criteria = staticmethod(validation_criteria)